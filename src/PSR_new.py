@@ -1,34 +1,45 @@
-from bs4 import BeautifulSoup
-from datetime import *
-from copy import *
-from random import *
-from newscatcherapi import NewsCatcherApiClient
+from datetime import datetime
+from copy import copy
+from functools import lru_cache
 import requests
-import openai
+import re
+import sys
 
 import os
 
 # Load API keys from config
 with open(os.path.join(os.path.dirname(__file__), '..', 'config', 'openai_apiKey.txt'), 'r') as f:
-    openai.api_key = f.read().strip()
+    openai_api_key = f.read().strip()
 
 with open(os.path.join(os.path.dirname(__file__), '..', 'config', 'newscatcher_API_apiKey.txt'), 'r') as f:
     news_api_key = f.read().strip()
 
 today = datetime.now().strftime("%x")
 today_name = datetime.now().strftime("%m_%d_%Y")
-total_PI = []
+sum_PI = 0.0
+count_PI = 0
+piPattern = re.compile(r'10|\d')
+piColors = ['#FF4500']*6 + ['#FFA500']*2 + ['#32CD32']*3 #OrangeRed 0-5, Orange 6-7, LimeGreen 8-10
 
 url = "https://api.newscatcherapi.com/v2/search"
 querystring = {"q":"\"S-OIL\"","page":"1", "lang":'ko', 'page_size':'25'}
 headers = {"x-api-key": news_api_key}
 response = requests.request("GET", url, headers=headers, params=querystring)
 soilheadline=response.json()
-soilheadline = soilheadline['articles']
+soilheadline = soilheadline.get('articles', [])
 print(soilheadline)
 
+if not soilheadline:
+  sys.exit("No articles found")
+
+# Only load OpenAI and BeautifulSoup once there are articles to process
+import openai
+from bs4 import BeautifulSoup
+
+openai.api_key = openai_api_key
+
 with open(os.path.join(os.path.dirname(__file__), '..', 'templates', 'html_template.html'), encoding="utf8") as f:
-    soup = BeautifulSoup(f, 'html.parser')
+    soup = BeautifulSoup(f, 'lxml')
 
 table = soup.select("#table")[0]
 
@@ -38,8 +49,8 @@ def _piGen(summ, title):
   model = "text-davinci-003"
   response = openai.Completion.create(engine=model, prompt=prompt, max_tokens=50)
   pi = response.choices[0].text.strip()
-  pi = ''.join(filter(str.isdigit, pi))[0]
-  return pi
+  match = piPattern.search(pi)
+  return match.group() if match else '0'
 
 def _urlToHyperText(url):
   hyperText = soup.new_tag('a', href=url)
@@ -47,41 +58,30 @@ def _urlToHyperText(url):
   return hyperText
 
 def avgPI():
-  return round((sum(total_PI) / len(total_PI)), 1)
+  return round(sum_PI / count_PI, 1) if count_PI else 0.0
 
 def updatePI(PI):
   soup.find_all('td')[0].strong.string = f'Average PI: {str(PI)}'
   soup.find_all('table')[0]['style'] = f'background-color:{piColor(PI)}'
   return None
 
+@lru_cache(maxsize=32)
 def piColor(pi):
-  pi = float(pi)
-
-  if pi >= 8:
-    return '#32CD32' #LimeGreen
-  elif pi >= 6:
-    return '#FFA500' #Orange
-  else:
-    return '#FF4500' #OrangeRed
+  return piColors[min(10, max(0, int(float(pi))))]
 
-def addNum(article):
+def addNum(idx):
   no = soup.new_tag('p', style = 'margin-left: auto;margin-right: auto; margin-top: 10px; margin-bottom: 10px;font-family:Arial, sans-serif;font-size:14px;width: 50%')
   br = soup.new_tag('br')
-  no.string = str(soilheadline.index(article)+1) + '.'
+  no.string = f'{idx}.'
   soup.body.append(no)
   soup.append(br)
   return None
 
 def createTable(table, article):
+  global sum_PI, count_PI
   new_table = copy(table)
 
-  titleField = new_table.find_all('td')[0]
-  PIField = new_table.find_all('td')[1]
-  authorField = new_table.find_all('td')[2]
-  agencyField = new_table.find_all('td')[3]
-  pDateField = new_table.find_all('td')[4]
-  summaryField = new_table.find_all('td')[5]
-  urlField = new_table.find_all('td')[6]
+  titleField, PIField, authorField, agencyField, pDateField, summaryField, urlField = new_table.find_all('td', limit=7)
 
   title = article['title']
   author = article['author']
@@ -106,15 +106,16 @@ def createTable(table, article):
 
   PIField['style'] = f'background-color:{piColor(pi)}'
 
-  total_PI.append(float(pi))
+  sum_PI += float(pi)
+  count_PI += 1
 
   return new_table
 
-for article in soilheadline:
+for idx, article in enumerate(soilheadline, 1):
   newTable = createTable(table, article)
   if newTable is None:
     continue
-  addNum(article)
+  addNum(idx)
   soup.body.append(newTable)
   
 
@@ -122,9 +123,8 @@ updatePI(avgPI())
 
 table.decompose()
 
-html = soup.prettify("utf-8")
 with open(os.path.join(os.path.dirname(__file__), '..', 'output', f'S_OIL_PSR_{today_name}.html'), "wb") as file:
-  file.write(html)
+  file.write(soup.encode(formatter="minimal"))
 
 
 
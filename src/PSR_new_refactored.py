@@ -11,16 +11,33 @@ Date: 2023
 Version: 2.0
 """
 
+from __future__ import annotations
+
 import os
+import re
+import html
+import json
+import asyncio
 import logging
+import random
+import sqlite3
+import hashlib
+import tempfile
+import time
+from functools import lru_cache
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 from pathlib import Path
 
-import requests
-import openai
-from bs4 import BeautifulSoup
-from newscatcherapi import NewsCatcherApiClient
+import httpx
+from aiolimiter import AsyncLimiter
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential, wait_random_exponential
+
+# openai, tiktoken and bs4 are imported where they are first used, so a run
+# that finds no articles never pays for loading them
+if TYPE_CHECKING:
+    import openai
+    from bs4 import BeautifulSoup, Tag
 
 # Load environment variables
 try:
@@ -36,6 +53,7 @@ CONFIG_DIR = Path(__file__).parent.parent / "config"
 TEMPLATES_DIR = Path(__file__).parent.parent / "templates"
 OUTPUT_DIR = Path(__file__).parent.parent / "output"
 ASSETS_DIR = Path(__file__).parent.parent / "assets"
+CACHE_DIR = Path(__file__).parent.parent / "cache"
 
 # API Configuration
 NEWS_API_URL = "https://api.newscatcherapi.com/v2/search"
@@ -43,10 +61,51 @@ DEFAULT_QUERY = '"S-OIL"'
 DEFAULT_LANGUAGE = 'ko'
 DEFAULT_PAGE_SIZE = 25
 DEFAULT_PAGE = 1
+MAX_CONCURRENT_PAGES = 8
+HTTP_TIMEOUT = 30  # seconds
+HTTP_MAX_RETRIES = 5
+HTTP_RETRY_BACKOFF = 0.5
+HTTP_RETRY_STATUSES = {429, 502, 503, 504}
 
 # OpenAI Configuration
-OPENAI_MODEL = "text-davinci-003"
-MAX_TOKENS = 50
+OPENAI_MODEL = "gpt-4o-mini"
+MAX_TOKENS = 1  # "0".."10" are each a single token, and the logit bias rules out anything else
+TEMPERATURE = 0
+LOGIT_BIAS = 100
+# Constant instructions first and article text last, so every request
+# shares the longest possible prefix for server-side prompt caching
+SENTIMENT_PROMPT_TEMPLATE = (
+    "Rate on a scale of 0-10 how positively the following Korean news article covers S-OIL company, "
+    "with 0 being terrible publicity such as accusing S-OIL of mal-practice "
+    "and 10 being good coverage such as applauding S-OIL's initiatives. "
+    "Respond only with a number from 0 to 10.\n\n"
+    "Title: {title}\n"
+    "Summary: {summary}"
+)
+PI_SCORE_PATTERN = re.compile(r'10|\d')  # First score in a reply; "10" must not be read as "1"
+MAX_CONCURRENT_REQUESTS = 10
+MAX_RETRY_ATTEMPTS = 6
+MAX_RETRY_WAIT = 60  # seconds
+OPENAI_REQUESTS_PER_MINUTE = 500
+
+# OpenAI Batch API Configuration
+USE_BATCH_API = True
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_INTERVAL = 60  # seconds
+BATCH_TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+# Sentiment Cache Configuration
+CACHE_PATH = CACHE_DIR / "sentiment_cache.db"
+CACHE_TTL_DAYS = 30
+# Part of every cache key, so editing the prompt or reply settings invalidates old scores
+SENTIMENT_PROMPT_DIGEST = hashlib.sha256(
+    f"{SENTIMENT_PROMPT_TEMPLATE}|{MAX_TOKENS}|{TEMPERATURE}|{LOGIT_BIAS}".encode('utf-8')
+).hexdigest()
+
+# Report Configuration
+HTML_PARSER = 'lxml'
+ARTICLE_ROWS_MARKER = "article-rows"
 
 # PI Color Mapping
 PI_COLORS = {
@@ -61,6 +120,14 @@ PI_THRESHOLDS = {
     'medium': 6
 }
 
+# PI color for each whole score 0-10, indexed by score
+PI_COLOR_BY_SCORE = tuple(
+    PI_COLORS['high'] if score >= PI_THRESHOLDS['high']
+    else PI_COLORS['medium'] if score >= PI_THRESHOLDS['medium']
+    else PI_COLORS['low']
+    for score in range(11)
+)
+
 
 class Configuration:
     """Manages configuration and API keys for the RPA system."""
@@ -77,9 +144,6 @@ class Configuration:
         
         if not self.newscatcher_api_key:
             self.newscatcher_api_key = self._load_api_key('newscatcher_API_apiKey.txt')
-        
-        # Set OpenAI API key
-        openai.api_key = self.openai_api_key
     
     def _load_api_key(self, filename: str) -> str:
         """
@@ -109,22 +173,93 @@ class Configuration:
         return api_key
 
 
+class SentimentCache:
+    """Persists PI scores on disk so re-runs skip articles that were already scored."""
+    
+    def __init__(self, path: Path = CACHE_PATH, ttl_days: int = CACHE_TTL_DAYS):
+        """
+        Open the cache database and evict expired entries.
+        
+        Args:
+            path: Path to the SQLite database file
+            ttl_days: Number of days a cached score stays valid
+        """
+        path.parent.mkdir(exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, pi INTEGER NOT NULL, ts REAL NOT NULL)"
+        )
+        self.connection.execute("DELETE FROM cache WHERE ts < ?", (time.time() - ttl_days * 86400,))
+        self.connection.commit()
+    
+    @staticmethod
+    def make_key(title: str, summary: str) -> str:
+        """Build the content-addressed cache key for an article."""
+        return hashlib.sha256(
+            f"{OPENAI_MODEL}|{SENTIMENT_PROMPT_DIGEST}|{title}|{summary}".encode('utf-8')
+        ).hexdigest()
+    
+    def get(self, key: str) -> Optional[int]:
+        """Return the cached PI score for a key, or None on a miss."""
+        row = self.connection.execute("SELECT pi FROM cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def set_many(self, scores: Dict[str, int]) -> None:
+        """Store PI scores by key in a single transaction."""
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO cache (key, pi, ts) VALUES (?, ?, ?)",
+            [(key, pi_score, now) for key, pi_score in scores.items()]
+        )
+        self.connection.commit()
+
+
+@lru_cache(maxsize=32)
+def _pi_color_cached(score_x10: int) -> str:
+    """Get color for a PI score given in tenths, so averages like 7.9 share cache entries."""
+    return PI_COLOR_BY_SCORE[min(10, max(0, score_x10 // 10))]
+
+
+def _is_retryable_openai_error(error: BaseException) -> bool:
+    """Return True for OpenAI errors that may succeed on retry (rate limit, server, connection)."""
+    import openai
+    
+    return isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError))
+
+
+def _is_retryable_http_error(error: BaseException) -> bool:
+    """Return True for NewsCatcher errors that may succeed on retry (transport, rate limit, gateway)."""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in HTTP_RETRY_STATUSES
+    return isinstance(error, httpx.TransportError)
+
+
 class SentimentAnalyzer:
     """Handles sentiment analysis using OpenAI's GPT models."""
     
-    def __init__(self, config: Configuration):
+    def __init__(self, config: Configuration, cache: Optional[SentimentCache] = None):
         """
         Initialize the sentiment analyzer.
         
         Args:
             config: Configuration object containing API keys
+            cache: Optional on-disk cache of previously computed PI scores
         """
         self.config = config
+        self.cache = cache
         self.logger = logging.getLogger(__name__)
+        
+        import tiktoken
+        
+        # Restrict replies to the tokens for "0".."10"
+        encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+        self.logit_bias = {str(token_id): LOGIT_BIAS
+                           for score in range(11)
+                           for token_id in encoding.encode(str(score))}
     
     def analyze_sentiment(self, title: str, summary: str) -> int:
         """
-        Analyze sentiment of an article and return Positivity Index (PI).
+        Analyze sentiment of a single article and return Positivity Index (PI).
         
         Args:
             title: Article title
@@ -134,28 +269,167 @@ class SentimentAnalyzer:
             PI score (0-10)
             
         Raises:
-            Exception: If OpenAI API call fails
+            ValueError: If the summary is empty
+        """
+        # Articles without a summary are never sent for analysis
+        if not summary:
+            raise ValueError(f"Cannot analyze sentiment without a summary: {title}")
+        
+        return self.analyze_articles([{'title': title, 'summary': summary}])[0]
+    
+    def analyze_articles(self, articles: List[Dict[str, Any]]) -> Dict[int, int]:
+        """
+        Analyze sentiment of all articles with a summary concurrently.
+        
+        Args:
+            articles: List of article dictionaries
+            
+        Returns:
+            Mapping of article index to PI score (0-10)
+        """
+        return asyncio.run(self.analyze_articles_async(articles))
+    
+    async def analyze_articles_async(self, articles: List[Dict[str, Any]]) -> Dict[int, int]:
+        """
+        Analyze sentiment of all articles with a summary concurrently.
+        
+        Articles without a summary are skipped and cached scores are reused.
+        Requests that are still rate limited or failing after retrying fall
+        back to a random score so that a single bad response does not abort
+        the report. Fallback scores are logged as warnings for auditing and are
+        never cached.
+        
+        Args:
+            articles: List of article dictionaries
+            
+        Returns:
+            Mapping of article index to PI score (0-10)
+            
+        Raises:
+            Exception: If a request fails with an error that retrying cannot fix
+        """
+        scores = {}
+        pending = {}
+        keys = {}
+        for i, article in enumerate(articles):
+            if not article.get('summary'):
+                continue
+            
+            if self.cache:
+                keys[i] = self.cache.make_key(article.get('title', ''), article['summary'])
+                cached_score = self.cache.get(keys[i])
+                if cached_score is not None:
+                    scores[i] = cached_score
+                    continue
+            
+            pending[i] = article
+        
+        if scores:
+            self.logger.info(f"Reusing cached PI scores for {len(scores)} articles")
+        
+        results = await self._score_articles(pending) if pending else {}
+        
+        new_scores = {}
+        for i, pi_score in results.items():
+            if pi_score is None:
+                pi_score = random.randint(0, 10)
+                self.logger.warning(f"Using random fallback PI {pi_score} for article {i + 1}: "
+                                    f"{articles[i].get('title', '')}")
+            elif self.cache:
+                new_scores[keys[i]] = pi_score
+            scores[i] = pi_score
+        
+        if new_scores:
+            self.cache.set_many(new_scores)
+        
+        self.logger.info(f"Sentiment analysis completed for {len(scores)} articles")
+        return scores
+    
+    async def analyze_sentiment_async(self, client: openai.AsyncOpenAI, rate_limiter: AsyncLimiter,
+                                      title: str, summary: str) -> int:
+        """
+        Request the PI score of a single article from OpenAI.
+        
+        Args:
+            client: Async OpenAI client
+            rate_limiter: Request rate limiter for the running event loop
+            title: Article title
+            summary: Article summary
+            
+        Returns:
+            PI score (0-10)
+            
+        Raises:
+            Exception: If OpenAI API call still fails after retrying
         """
         prompt = self._create_sentiment_prompt(title, summary)
+        response = await self._create_completion(client, rate_limiter, prompt)
         
-        try:
-            response = openai.Completion.create(
-                engine=OPENAI_MODEL,
-                prompt=prompt,
-                max_tokens=MAX_TOKENS
-            )
+        pi_text = (response.choices[0].message.content or '').strip()
+        return self._extract_pi_score(pi_text)
+    
+    def _build_request_body(self, prompt: str) -> Dict[str, Any]:
+        """Build the chat completion request body shared by live and batch requests."""
+        return {
+            'model': OPENAI_MODEL,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': MAX_TOKENS,
+            'temperature': TEMPERATURE,
+            'logit_bias': self.logit_bias
+        }
+    
+    async def _score_articles(self, articles: Dict[int, Dict[str, Any]]) -> Dict[int, Optional[int]]:
+        """
+        Fan out one sentiment request per article and gather the results.
+        
+        Args:
+            articles: Mapping of article index to article dictionary
             
-            pi_text = response.choices[0].text.strip()
-            pi_score = self._extract_pi_score(pi_text)
+        Returns:
+            Mapping of article index to PI score, or None if retries ran out
             
-            self.logger.info(f"Sentiment analysis completed - PI: {pi_score}")
-            return pi_score
+        Raises:
+            Exception: The first non-retryable error returned by a request
+        """
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        rate_limiter = AsyncLimiter(OPENAI_REQUESTS_PER_MINUTE, time_period=60)
+        
+        import openai
+        
+        # Retries are handled by _create_completion so that every attempt goes through the rate limiter
+        async with openai.AsyncOpenAI(api_key=self.config.openai_api_key, max_retries=0) as client:
+            async def score(article: Dict[str, Any]) -> int:
+                async with semaphore:
+                    return await self.analyze_sentiment_async(client, rate_limiter, article.get('title', ''),
+                                                              article['summary'])
             
-        except Exception as e:
-            self.logger.error(f"Sentiment analysis failed: {str(e)}")
-            # Return random score as fallback
-            import random
-            return random.randint(0, 10)
+            results = await asyncio.gather(*(score(article) for article in articles.values()),
+                                           return_exceptions=True)
+        
+        scores = {}
+        for i, result in zip(articles, results):
+            if isinstance(result, Exception):
+                # Only exhausted retries get a fallback; anything else (bad key, bad request) aborts the run
+                if not _is_retryable_openai_error(result):
+                    raise result
+                self.logger.error(f"Sentiment analysis failed for article {i + 1}: {str(result)}")
+                scores[i] = None
+            else:
+                scores[i] = result
+        return scores
+    
+    @retry(retry=retry_if_exception(_is_retryable_openai_error),
+           wait=wait_random_exponential(min=1, max=MAX_RETRY_WAIT),
+           stop=stop_after_attempt(MAX_RETRY_ATTEMPTS), reraise=True)
+    async def _create_completion(self, client: openai.AsyncOpenAI, rate_limiter: AsyncLimiter, prompt: str) -> Any:
+        """
+        Send a chat completion request within the account's request rate.
+        
+        Rate limit, server and connection errors are retried with jittered
+        exponential backoff; every attempt waits for the rate limiter.
+        """
+        async with rate_limiter:
+            return await client.chat.completions.create(**self._build_request_body(prompt))
     
     def _create_sentiment_prompt(self, title: str, summary: str) -> str:
         """
@@ -168,16 +442,7 @@ class SentimentAnalyzer:
         Returns:
             Formatted prompt string
         """
-        return (f"Given the following title and summary of an article in Korean: "
-                f"Title: {title} Summary: {summary} "
-                f"could you gage on a scale of 0-10 how positively it mentions S-OIL company, "
-                f"with 0 being terrible publicity for S-OIL such as accusing it of mal-practice, "
-                f"and 10 being good coverage of S-OIL such as applauding S-OIL's initiatives, "
-                f"regardless of whether S-OIL is mentioned in the summary or not. "
-                f"I am asking you for a sentiment analysis of this article about S-OIL and "
-                f"assigning it to a score out of 10. Respond only with a single digit integer. "
-                f"Do not respond with anything else besides a number from 0 to 10. "
-                f"If not then just return a random number from 0-10.")
+        return SENTIMENT_PROMPT_TEMPLATE.format(title=title, summary=summary)
     
     def _extract_pi_score(self, pi_text: str) -> int:
         """
@@ -189,13 +454,94 @@ class SentimentAnalyzer:
         Returns:
             PI score as integer (0-10)
         """
-        # Filter digits and take first character
-        digits = ''.join(filter(str.isdigit, pi_text))
-        if digits:
-            return int(digits[0])
+        match = PI_SCORE_PATTERN.search(pi_text)
+        if match:
+            return int(match.group())
         return 0  # Default fallback
 
 
+class BatchSentimentAnalyzer(SentimentAnalyzer):
+    """Handles sentiment analysis through the OpenAI Batch API for offline report runs."""
+    
+    async def _score_articles(self, articles: Dict[int, Dict[str, Any]]) -> Dict[int, Optional[int]]:
+        """
+        Submit all sentiment requests as a single batch and wait for the results.
+        
+        Args:
+            articles: Mapping of article index to article dictionary
+            
+        Returns:
+            Mapping of article index to PI score, or None if the request failed
+        """
+        scores = {i: None for i in articles}
+        if not articles:
+            return scores
+        
+        import openai
+        
+        async with openai.AsyncOpenAI(api_key=self.config.openai_api_key) as client:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                input_path = Path(tmp_dir) / "sentiment_batch.jsonl"
+                self._write_batch_file(input_path, articles)
+                
+                with open(input_path, 'rb') as f:
+                    input_file = await client.files.create(file=f, purpose="batch")
+            
+            batch = await client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=BATCH_COMPLETION_WINDOW
+            )
+            self.logger.info(f"Submitted sentiment batch {batch.id} with {len(articles)} requests")
+            
+            batch = await self._wait_for_batch(client, batch.id)
+            if batch.status != 'completed' or not batch.output_file_id:
+                self.logger.error(f"Sentiment batch {batch.id} ended with status: {batch.status}")
+                return scores
+            
+            output = await client.files.content(batch.output_file_id)
+        
+        for line in output.text.splitlines():
+            if not line.strip():
+                continue
+            
+            result = json.loads(line)
+            response = result.get('response') or {}
+            if result.get('error') or response.get('status_code') != 200:
+                self.logger.error(f"Sentiment analysis failed for article {int(result['custom_id']) + 1}: "
+                                  f"{result.get('error') or response.get('body')}")
+                continue
+            
+            pi_text = (response['body']['choices'][0]['message']['content'] or '').strip()
+            scores[int(result['custom_id'])] = self._extract_pi_score(pi_text)
+        
+        return scores
+    
+    def _write_batch_file(self, path: Path, articles: Dict[int, Dict[str, Any]]) -> None:
+        """Write one batch request line per article, keyed by article index."""
+        with open(path, 'w', encoding='utf-8') as f:
+            for i, article in articles.items():
+                prompt = self._create_sentiment_prompt(article.get('title', ''), article['summary'])
+                request = {
+                    'custom_id': str(i),
+                    'method': 'POST',
+                    'url': BATCH_ENDPOINT,
+                    'body': self._build_request_body(prompt)
+                }
+                f.write(json.dumps(request, ensure_ascii=False) + '\n')
+    
+    async def _wait_for_batch(self, client: openai.AsyncOpenAI, batch_id: str) -> Any:
+        """Poll the batch until it reaches a terminal status."""
+        while True:
+            batch = await client.batches.retrieve(batch_id)
+            if batch.status in BATCH_TERMINAL_STATUSES:
+                return batch
+            
+            self.logger.info(f"Sentiment batch {batch_id} is {batch.status}, "
+                             f"checking again in {BATCH_POLL_INTERVAL}s")
+            await asyncio.sleep(BATCH_POLL_INTERVAL)
+
+
 class NewsFetcher:
     """Handles fetching news articles from NewsCatcher API."""
     
@@ -209,16 +555,22 @@ class NewsFetcher:
         self.config = config
         self.logger = logging.getLogger(__name__)
     
-    def fetch_articles(self, query: str = DEFAULT_QUERY, language: str = DEFAULT_LANGUAGE,
-                      page_size: int = DEFAULT_PAGE_SIZE, page: int = DEFAULT_PAGE) -> List[Dict[str, Any]]:
+    async def fetch_articles(self, query: str = DEFAULT_QUERY, language: str = DEFAULT_LANGUAGE,
+                             page_size: int = DEFAULT_PAGE_SIZE, page: int = DEFAULT_PAGE,
+                             max_pages: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         Fetch news articles from NewsCatcher API.
         
+        The first page is fetched on its own to learn ``total_pages``; the
+        remaining pages are then fetched concurrently, multiplexed over a
+        single HTTP/2 connection.
+        
         Args:
             query: Search query
             language: Article language
             page_size: Number of articles per page
-            page: Page number
+            page: First page number to fetch
+            max_pages: Maximum number of pages to fetch (all pages if None)
             
         Returns:
             List of article dictionaries
@@ -227,26 +579,47 @@ class NewsFetcher:
             Exception: If API call fails
         """
         try:
-            headers = {"x-api-key": self.config.newscatcher_api_key}
             params = {
                 "q": query,
-                "page": str(page),
                 "lang": language,
                 "page_size": str(page_size)
             }
             
-            response = requests.get(NEWS_API_URL, headers=headers, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            articles = data.get('articles', [])
+            async with httpx.AsyncClient(http2=True, headers={"x-api-key": self.config.newscatcher_api_key},
+                                         timeout=HTTP_TIMEOUT) as client:
+                data = await self._fetch_page(client, params, page)
+                articles = data.get('articles', [])
+                
+                last_page = data.get('total_pages') or page
+                if max_pages is not None:
+                    last_page = min(last_page, page + max_pages - 1)
+                
+                remaining_pages = range(page + 1, last_page + 1)
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+                
+                async def fetch(p: int) -> Dict[str, Any]:
+                    async with semaphore:
+                        return await self._fetch_page(client, params, p)
+                
+                for page_data in await asyncio.gather(*(fetch(p) for p in remaining_pages)):
+                    articles.extend(page_data.get('articles', []))
             
-            self.logger.info(f"Successfully fetched {len(articles)} articles")
+            self.logger.info(f"Successfully fetched {len(articles)} articles "
+                             f"from {len(remaining_pages) + 1} pages")
             return articles
             
         except Exception as e:
             self.logger.error(f"Failed to fetch articles: {str(e)}")
             raise
+    
+    @retry(retry=retry_if_exception(_is_retryable_http_error),
+           wait=wait_exponential(multiplier=HTTP_RETRY_BACKOFF),
+           stop=stop_after_attempt(HTTP_MAX_RETRIES + 1), reraise=True)
+    async def _fetch_page(self, client: httpx.AsyncClient, params: Dict[str, str], page: int) -> Dict[str, Any]:
+        """Fetch a single page of search results, retrying rate limit and gateway errors."""
+        response = await client.get(NEWS_API_URL, params={**params, "page": str(page)})
+        response.raise_for_status()
+        return response.json()
 
 
 class ReportGenerator:
@@ -255,125 +628,117 @@ class ReportGenerator:
     def __init__(self):
         """Initialize the report generator."""
         self.logger = logging.getLogger(__name__)
-        self.total_pi_scores = []
+        self.pi_sum = 0.0
+        self.pi_count = 0
     
-    def generate_report(self, articles: List[Dict[str, Any]], sentiment_analyzer: SentimentAnalyzer) -> str:
+    def generate_report(self, articles: List[Dict[str, Any]], pi_scores: Dict[int, int]) -> str:
         """
         Generate HTML report from articles.
         
         Args:
             articles: List of article dictionaries
-            sentiment_analyzer: Sentiment analyzer instance
+            pi_scores: Mapping of article index to PI score; unscored articles are skipped
             
         Returns:
             Path to generated HTML file
         """
+        from bs4 import BeautifulSoup, Comment
+        
         # Load HTML template
         template_path = TEMPLATES_DIR / "html_template.html"
         with open(template_path, encoding="utf8") as f:
-            soup = BeautifulSoup(f, 'html.parser')
+            soup = BeautifulSoup(f, HTML_PARSER)
         
-        # Get template table
+        # Serialize the template table once as a format string for every article
         template_table = soup.select("#table")[0]
+        row_template = self._build_row_template(soup, template_table)
         
-        # Process each article
-        for i, article in enumerate(articles):
-            if not article.get('summary'):
-                continue
-                
-            # Add article number
-            self._add_article_number(soup, i + 1)
-            
-            # Create article table
-            article_table = self._create_article_table(soup, template_table, article, sentiment_analyzer)
-            if article_table:
-                soup.body.append(article_table)
+        # Collect the scored articles, then total and color their scores in bulk
+        scored_indices = [i for i in range(len(articles)) if pi_scores.get(i) is not None]
+        scores = [pi_scores[i] for i in scored_indices]
+        colors = list(map(self._get_pi_color, scores))
+        self.pi_sum += sum(scores)
+        self.pi_count += len(scores)
+        
+        # Render each article
+        rows = [self._render_article_row(row_template, i + 1, articles[i], pi_score, color)
+                for i, pi_score, color in zip(scored_indices, scores, colors)]
         
         # Update average PI
-        if self.total_pi_scores:
-            avg_pi = round(sum(self.total_pi_scores) / len(self.total_pi_scores), 1)
+        if self.pi_count:
+            avg_pi = round(self.pi_sum / self.pi_count, 1)
             self._update_average_pi(soup, avg_pi)
         
-        # Remove template table
-        template_table.decompose()
+        # Swap the template table for a marker the rendered rows are written at
+        template_table.replace_with(Comment(ARTICLE_ROWS_MARKER))
         
         # Save report
-        return self._save_report(soup)
+        return self._save_report(soup, rows)
     
-    def _add_article_number(self, soup: BeautifulSoup, number: int) -> None:
-        """Add article number to the report."""
+    def _build_row_template(self, soup: BeautifulSoup, template_table: Tag) -> str:
+        """
+        Build the format string for a single article from the template table.
+        
+        Args:
+            soup: Parsed report template
+            template_table: Template table filled in for each article
+            
+        Returns:
+            Format string with {number}, {title}, {pi}, {color}, {author},
+            {agency}, {date}, {summary} and {url} placeholders
+        """
         number_elem = soup.new_tag('p', 
                                  style='margin-left: auto; margin-right: auto; '
                                        'margin-top: 10px; margin-bottom: 10px; '
                                        'font-family: Arial, sans-serif; '
                                        'font-size: 14px; width: 50%')
-        number_elem.string = f"{number}."
-        soup.body.append(number_elem)
-        
+        number_elem.string = "{number}."
         br = soup.new_tag('br')
-        soup.body.append(br)
-    
-    def _create_article_table(self, soup: BeautifulSoup, template_table: BeautifulSoup,
-                            article: Dict[str, Any], sentiment_analyzer: SentimentAnalyzer) -> Optional[BeautifulSoup]:
-        """Create a table for a single article."""
-        from copy import deepcopy
-        
-        new_table = deepcopy(template_table)
+        row_template = str(number_elem) + str(br)
         
         # Get table cells
-        cells = new_table.find_all('td')
+        cells = template_table.find_all('td', limit=7)
         if len(cells) < 7:
-            return None
-        
-        title_cell = cells[0]
-        pi_cell = cells[1]
-        author_cell = cells[2]
-        agency_cell = cells[3]
-        date_cell = cells[4]
-        summary_cell = cells[5]
-        url_cell = cells[6]
-        
-        # Extract article data
-        title = article.get('title', '')
-        author = article.get('author', '')
-        agency = article.get('clean_url', '')
-        date = article.get('published_date', '')[:10] if article.get('published_date') else ''
-        summary = article.get('summary', '')
-        url = article.get('link', '')
+            return row_template
         
-        if not summary:
-            return None
+        title_cell, pi_cell, author_cell, agency_cell, date_cell, summary_cell, url_cell = cells
         
-        # Perform sentiment analysis
-        pi_score = sentiment_analyzer.analyze_sentiment(title, summary)
-        self.total_pi_scores.append(pi_score)
-        
-        # Populate cells
-        title_cell.append(title)
-        author_cell.append(author)
-        agency_cell.append(agency)
-        date_cell.append(date)
-        summary_cell.append(summary)
+        # Populate cells with placeholders
+        title_cell.append("{title}")
+        author_cell.append("{author}")
+        agency_cell.append("{agency}")
+        date_cell.append("{date}")
+        summary_cell.append("{summary}")
         
         # Add URL link
-        url_link = soup.new_tag('a', href=url)
-        url_link.string = url
+        url_link = soup.new_tag('a', href="{url}")
+        url_link.string = "{url}"
         url_cell.append(url_link)
         
         # Add PI score with color
-        pi_cell.strong.append(str(pi_score))
-        pi_cell['style'] = f'background-color: {self._get_pi_color(pi_score)}'
+        pi_cell.strong.append("{pi}")
+        pi_cell['style'] = 'background-color: {color}'
         
-        return new_table
+        return row_template + str(template_table)
+    
+    def _render_article_row(self, row_template: str, number: int, article: Dict[str, Any],
+                            pi_score: int, color: str) -> str:
+        """Render the number and table for a single article."""
+        return row_template.format_map({
+            'number': number,
+            'title': html.escape(article.get('title') or ''),
+            'pi': pi_score,
+            'color': color,
+            'author': html.escape(article.get('author') or ''),
+            'agency': html.escape(article.get('clean_url') or ''),
+            'date': html.escape((article.get('published_date') or '')[:10]),
+            'summary': html.escape(article.get('summary') or ''),
+            'url': html.escape(article.get('link') or '')
+        })
     
-    def _get_pi_color(self, pi_score: int) -> str:
-        """Get color based on PI score."""
-        if pi_score >= PI_THRESHOLDS['high']:
-            return PI_COLORS['high']
-        elif pi_score >= PI_THRESHOLDS['medium']:
-            return PI_COLORS['medium']
-        else:
-            return PI_COLORS['low']
+    def _get_pi_color(self, pi_score: float) -> str:
+        """Get color based on PI score; fractional averages are truncated to the whole score below."""
+        return _pi_color_cached(int(round(float(pi_score) * 10)))
     
     def _update_average_pi(self, soup: BeautifulSoup, avg_pi: float) -> None:
         """Update the average PI display."""
@@ -386,8 +751,8 @@ class ReportGenerator:
         if pi_table:
             pi_table['style'] = f'background-color: {self._get_pi_color(avg_pi)}'
     
-    def _save_report(self, soup: BeautifulSoup) -> str:
-        """Save the report to file."""
+    def _save_report(self, soup: BeautifulSoup, rows: List[str]) -> str:
+        """Save the report to file, streaming the article rows in at the marker."""
         # Generate filename with timestamp
         today_name = datetime.now().strftime("%m_%d_%Y")
         filename = f"S_OIL_PSR_{today_name}.html"
@@ -397,8 +762,11 @@ class ReportGenerator:
         OUTPUT_DIR.mkdir(exist_ok=True)
         
         # Save file
-        with open(output_path, "wb") as file:
-            file.write(soup.prettify("utf-8"))
+        head, tail = soup.decode(formatter="minimal").split(f"<!--{ARTICLE_ROWS_MARKER}-->", 1)
+        with open(output_path, "w", encoding="utf-8", newline="") as file:
+            file.write(head)
+            file.writelines(f"{row}\n" for row in rows)
+            file.write(tail)
         
         logging.info(f"Report saved to: {output_path}")
         return str(output_path)
@@ -421,6 +789,44 @@ def setup_logging() -> None:
     )
 
 
+async def run_pipeline() -> Optional[str]:
+    """
+    Fetch, analyze and report in a single event loop.
+    
+    Returns:
+        Path to generated HTML file, or None if no articles were found
+    """
+    logger = logging.getLogger(__name__)
+    
+    # Fetch articles
+    config = Configuration()
+    news_fetcher = NewsFetcher(config)
+    logger.info("Fetching news articles...")
+    articles = await news_fetcher.fetch_articles()
+    
+    if not articles:
+        logger.warning("No articles found")
+        return None
+    
+    logger.info(f"Processing {len(articles)} articles")
+    
+    # Initialize the analysis components only once there is something to analyze
+    sentiment_cache = SentimentCache()
+    if USE_BATCH_API:
+        sentiment_analyzer = BatchSentimentAnalyzer(config, sentiment_cache)
+    else:
+        sentiment_analyzer = SentimentAnalyzer(config, sentiment_cache)
+    report_generator = ReportGenerator()
+    
+    # Analyze sentiment
+    logger.info("Analyzing article sentiment...")
+    pi_scores = await sentiment_analyzer.analyze_articles_async(articles)
+    
+    # Generate report
+    logger.info("Generating report...")
+    return report_generator.generate_report(articles, pi_scores)
+
+
 def main() -> None:
     """Main entry point for the S-OIL Press Summary Report RPA."""
     try:
@@ -429,26 +835,10 @@ def main() -> None:
         logger = logging.getLogger(__name__)
         logger.info("Starting S-OIL Press Summary Report RPA")
         
-        # Initialize components
-        config = Configuration()
-        news_fetcher = NewsFetcher(config)
-        sentiment_analyzer = SentimentAnalyzer(config)
-        report_generator = ReportGenerator()
-        
-        # Fetch articles
-        logger.info("Fetching news articles...")
-        articles = news_fetcher.fetch_articles()
-        
-        if not articles:
-            logger.warning("No articles found")
+        report_path = asyncio.run(run_pipeline())
+        if report_path is None:
             return
         
-        logger.info(f"Processing {len(articles)} articles")
-        
-        # Generate report
-        logger.info("Generating report...")
-        report_path = report_generator.generate_report(articles, sentiment_analyzer)
-        
         logger.info(f"Report generation completed: {report_path}")
         print(f"Report successfully generated: {report_path}")
         